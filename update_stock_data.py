@@ -1,16 +1,114 @@
 import akshare as ak
 import openpyxl
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import takewhile
 import os
+import random
+import threading
+import time
 import argparse
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, fall back to plain numpy
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+HISTORY_WORKERS = 16  # 并发下载历史行情的线程数
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+CACHE_DIR = os.path.expanduser("~/.cache/vitools")
+SPOT_CACHE_TTL = 300  # 行情缓存有效期（秒）
+HISTORY_COLUMNS = ["收盘", "涨跌额", "最高", "最低", "涨跌幅"]  # 计算波动率和更新现价用到的列
+
+# one keep-alive connection pool for all history requests, so TCP/TLS handshakes are reused.
+# retries are left to get_stock_history, the adapter itself does not retry.
+# requests.Session is not documented as thread-safe, so every worker thread gets its own
+# session; they all mount this adapter, whose urllib3 pool manager is thread-safe.
+_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+_LOCAL = threading.local()
+
+def _thread_session():
+    """
+    get the keep-alive session of the current thread
+    """
+    session = getattr(_LOCAL, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", _ADAPTER)
+        session.mount("http://", _ADAPTER)
+        _LOCAL.session = session
+    return session
+
+class _PooledRequests:
+    """
+    stand-in for the requests module, sends get/post through the pooled sessions
+    """
+    def get(self, *args, **kwargs):
+        return _thread_session().get(*args, **kwargs)
+
+    def post(self, *args, **kwargs):
+        return _thread_session().post(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+@contextmanager
+def pooled_session():
+    """
+    route akshare's history requests (stock_hk_hist / stock_zh_a_hist) through the pooled
+    sessions, restoring akshare's own requests on exit
+    """
+    try:
+        from akshare.stock_feature import stock_hist_em
+    except ImportError:
+        yield  # layout of akshare changed, keep its own requests
+        return
+    original_requests = stock_hist_em.requests
+    stock_hist_em.requests = _PooledRequests()
+    try:
+        yield
+    finally:
+        stock_hist_em.requests = original_requests
+
+def cached_spot_data(name, fetch):
+    """
+    fetch spot data through a short-lived parquet cache on disk
+    @name: str, cache name
+    @fetch: callable, returns pandas.DataFrame
+    """
+    cache_file = os.path.join(CACHE_DIR, f"spot_{name}.parquet")
+    try:
+        if time.time() - os.path.getmtime(cache_file) < SPOT_CACHE_TTL:
+            return pd.read_parquet(cache_file)
+    except Exception:
+        pass  # no cache or unreadable cache, fetch it again
+
+    data = fetch()
+    if not data.empty:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            data.to_parquet(cache_file)
+        except ImportError:
+            pass  # no parquet engine installed, run without the cache
+        except Exception as e:
+            print(f"Error caching {name} spot data: {e}")
+    return data
 
 def get_a_share_data():
     """
     get the stock data of A-shares
     """
     try:
-        return ak.stock_zh_a_spot_em()
+        return cached_spot_data("a", ak.stock_zh_a_spot_em)
     except Exception as e:
         print(f"Error fetching A-share data: {e}")
         return pd.DataFrame()  # Return empty DataFrame on failure
@@ -20,58 +118,134 @@ def get_hk_share_data():
     get the stock data of HK-shares
     """
     try:
-        return ak.stock_hk_spot_em()
+        return cached_spot_data("hk", ak.stock_hk_spot_em)
     except Exception as e:
         print(f"Error fetching HK-share data: {e}")
         return pd.DataFrame()  # Return empty DataFrame on failure
 
-def get_stock_history(stock_code, days=30):
+@lru_cache(maxsize=4)
+def history_window(days):
+    """
+    get the (start_date, end_date) of the history window, computed once per run
+    so every stock uses exactly the same dates
+    @days: int, the number of days
+    """
+    end = datetime.now()
+    return (end - timedelta(days=days)).strftime("%Y%m%d"), end.strftime("%Y%m%d")
+
+def get_stock_history(stock_code, days=30, max_retry=3, columns=HISTORY_COLUMNS):
     """
     get the stock history data
     @stock_code: str, stock code
     @days: int, the number of days
+    @max_retry: int, the number of attempts before giving up
+    @columns: list, the columns to keep, None keeps all of them
     """
-    end_date = datetime.now().strftime("%Y%m%d")
-    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y%m%d")
-    
-    try:
-        if len(stock_code) == 5:
-            return ak.stock_hk_hist(symbol=stock_code,period = "daily",start_date=start_date, end_date=end_date, adjust="qfq")
-        elif len(stock_code) == 6:
-            return ak.stock_zh_a_hist(symbol=stock_code, period="daily",start_date=start_date, end_date=end_date, adjust="qfq")
-        else:
-            return pd.DataFrame()
-    except Exception as e:
-        print(f"Error fetching history for {stock_code}: {e}")
+    start_date, end_date = history_window(days)
+
+    data = None
+    for attempt in range(1, max_retry + 1):
+        try:
+            if len(stock_code) == 5:
+                data = ak.stock_hk_hist(symbol=stock_code,period = "daily",start_date=start_date, end_date=end_date, adjust="qfq")
+            elif len(stock_code) == 6:
+                data = ak.stock_zh_a_hist(symbol=stock_code, period="daily",start_date=start_date, end_date=end_date, adjust="qfq")
+            else:
+                return pd.DataFrame()
+            break
+        except Exception as e:
+            print(f"Error fetching history for {stock_code} (attempt {attempt}/{max_retry}): {e}")
+            if attempt < max_retry:
+                # back off with a little jitter so the workers don't retry in lockstep
+                time.sleep(0.5 * 2 ** (attempt - 1) + random.uniform(0, 0.5))
+    if data is None:
         return pd.DataFrame()
+
+    # drop the unused columns right away, a missing column is not worth a retry
+    if columns is not None and not data.empty:
+        missing_columns = [col for col in columns if col not in data.columns]
+        if missing_columns:
+            print(f"Error fetching history for {stock_code}: columns {missing_columns} are missing")
+            return pd.DataFrame()
+        data = data[columns]
+    return data
     
+@njit(cache=True)
+def _volatility(close, change, high, low):
+    """
+    volatility kernel on raw arrays
+    @close, change, high, low: numpy.ndarray, 收盘/涨跌额/最高/最低
+    """
+    # single pass, accumulating the three sums together. like pandas mean()/max(axis=1),
+    # bars with an invalid value (NaN from akshare's to_numeric coerce) are skipped
+    # float64 accumulators, so the float32 inputs are summed in float64 with or without numba
+    n = close.shape[0]
+    sum_h = np.float64(0.0)
+    sum_l = np.float64(0.0)
+    sum_v = np.float64(0.0)
+    count_h = 0
+    count_l = 0
+    count_v = 0
+    for k in range(n):
+        prev_close = close[k] - change[k]
+        # a zero prev_close would raise ZeroDivisionError under numba, skip it like a NaN bar
+        if not np.isfinite(prev_close) or prev_close == 0:
+            continue
+        volatility_h = (high[k] - prev_close) / prev_close
+        volatility_l = (low[k] - prev_close) / prev_close
+        valid_h = np.isfinite(volatility_h)
+        valid_l = np.isfinite(volatility_l)
+        if valid_h:
+            sum_h += volatility_h
+            count_h += 1
+        if valid_l:
+            sum_l += volatility_l
+            count_l += 1
+        if valid_h and valid_l:
+            sum_v += max(volatility_h, -volatility_l)
+            count_v += 1
+        elif valid_h or valid_l:
+            sum_v += volatility_h if valid_h else -volatility_l
+            count_v += 1
+    mean_h = sum_h / count_h if count_h else np.nan
+    mean_l = sum_l / count_l if count_l else np.nan
+    mean_v = sum_v / count_v if count_v else np.nan
+    return mean_h, mean_l, mean_v
+
 def calculate_volatility(stock_data):
     """
     calculate the volatility of stock
     @stock_data: pandas.DataFrame, stock data
     """
-    stock_data["前收盘"] = stock_data["收盘"] - stock_data["涨跌额"]
-    stock_data["波动率h"] = (stock_data["最高"] - stock_data["前收盘"]) / stock_data["前收盘"]
-    stock_data["波动率l"] = (stock_data["最低"] - stock_data["前收盘"]) / stock_data["前收盘"]
-    stock_data["负波动率l"] = -stock_data["波动率l"]
-    stock_data["波动率"] = stock_data[["波动率h", "负波动率l"]].max(axis=1)
-    mean_volatility_h = stock_data["波动率h"].mean()
-    mean_volatility_l = stock_data["波动率l"].mean()
-    mean_volatility = stock_data["波动率"].mean()
-    return mean_volatility_h, mean_volatility_l, mean_volatility
+    close = stock_data["收盘"].to_numpy(dtype=np.float32)
+    change = stock_data["涨跌额"].to_numpy(dtype=np.float32)
+    high = stock_data["最高"].to_numpy(dtype=np.float32)
+    low = stock_data["最低"].to_numpy(dtype=np.float32)
+    return _volatility(close, change, high, low)
 
-def update_excel(data, file_name = "hk.xlsx"):
+def update_excel(data, file_name = "hk.xlsx", dump_only = False):
     """
     save the stock data to excel
     @data: pandas.DataFrame, stock data
     @file_name: excel name
+    @dump_only: bool, overwrite the file instead of appending to it
     """
-    try:
+    if dump_only or not os.path.exists(file_name):
+        try:
+            # xlsxwriter writes the xml directly, faster than openpyxl for a fresh file
+            data.to_excel(file_name, engine="xlsxwriter", index=False)
+            print(f"data is updated in {file_name}")
+            return
+        except ImportError:
+            pass  # xlsxwriter is not installed, fall back to openpyxl
+
+    if not dump_only and os.path.exists(file_name):
         wb = openpyxl.load_workbook(file_name)
         ws = wb.active
-    except FileNotFoundError:
-        wb = openpyxl.Workbook()
-        ws = wb.active
+    else:
+        # a new file can be streamed row by row with a write-only workbook
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
         # write header
         headers = list(data.columns)
         ws.append(headers)
@@ -83,27 +257,66 @@ def update_excel(data, file_name = "hk.xlsx"):
     wb.save(file_name)
     print(f"data is updated in {file_name}")
 
-def update_stock_prices(file_name:str, sheet_name:str):
+def write_row(ws, row, values):
+    """
+    write a batch of values into one row, only touching the cells that changed
+    @ws: openpyxl worksheet
+    @row: int, row number
+    @values: dict, column number -> value
+    Returns: set - column numbers that were actually changed
+    """
+    changed = set()
+    for col, value in values.items():
+        cell = ws.cell(row=row, column=col)
+        if cell.value != value:
+            cell.value = value
+            changed.add(col)
+    return changed
+
+def load_workbook(file_name:str):
+    """
+    load the excel once for all updaters, skipping external links and vba
+    @file_name: excel name
+    """
+    return openpyxl.load_workbook(file_name, keep_links=False, keep_vba=False)
+
+def read_headers(ws):
+    """
+    read the header row as a title -> column number mapping
+    @ws: openpyxl worksheet
+    """
+    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+    return {value: idx+1 for idx, value in enumerate(header_row) if value is not None}
+
+def read_codes(ws, stock_code_col:int):
+    """
+    read the stock codes of the sheet, from row 2 down to the first empty 代码 cell
+    @ws: openpyxl worksheet
+    @stock_code_col: int, column number of 代码
+    """
+    rows = ws.iter_rows(min_row=2, min_col=stock_code_col, max_col=stock_code_col, values_only=True)
+    return [row[0] for row in takewhile(lambda row: row[0], rows)]
+
+def update_stock_prices(wb, sheet_name:str, now_str:str = None):
     """
-    update stock prices in exist excel
+    update stock prices in the loaded workbook, the caller saves it
+    @now_str: str - timestamp written to 更新时间, defaults to now
     Returns: bool - True if prices were successfully updated, False otherwise
     """
     print("-----------------------------")
-    # read excel
-    wb = openpyxl.load_workbook(file_name)
     if sheet_name not in wb.sheetnames:
         print(f"sheet {sheet_name} is not exist!")
-        return
+        return False
     
     ws = wb[sheet_name]
 
-    headers = {cell.value: idx+1 for idx, cell in enumerate(ws[1])}  # 标题 -> 列号映射
+    headers = read_headers(ws)  # 标题 -> 列号映射
 
     required_columns = ["代码", "现价(CNY)", "现价(HKD)", "今日涨幅", "总股本", "更新时间"]
     for col in required_columns:
         if col not in headers:
             print(f"--- Error!!! --- column {col} is missing.")
-            return
+            return False
 
     stock_code_col = headers["代码"]
     a_share_price_col = headers["现价(CNY)"]
@@ -115,19 +328,20 @@ def update_stock_prices(file_name:str, sheet_name:str):
     # 前低列（可选）
     previous_low_col = headers.get("前低")
 
-    stock_codes = [row[stock_code_col-1].value for row in ws.iter_rows(min_row=2, max_col=stock_code_col+1) if row[stock_code_col].value]
+    stock_codes = read_codes(ws, stock_code_col)
 
-    # fetching share data
-    print("fetching A-share data...")
-    a_share_data = get_a_share_data()
+    # fetching share data, the two markets are independent so fetch them concurrently
+    print("fetching A-share and HK-share data...")
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        a_future = ex.submit(get_a_share_data)
+        hk_future = ex.submit(get_hk_share_data)
+        a_share_data = a_future.result()
+        hk_share_data = hk_future.result()
     
     if a_share_data.empty:
         print("Failed to fetch A-share data. Exiting...")
         return False
 
-    print("fetching HK-share data...")
-    hk_share_data = get_hk_share_data()
-    
     if hk_share_data.empty:
         print("Failed to fetch HK-share data. Exiting...")
         return False
@@ -135,82 +349,108 @@ def update_stock_prices(file_name:str, sheet_name:str):
     # for debug
     debug_flag = False
     if debug_flag:
-        update_excel(a_share_data, file_name = "a.xlsx")
-        update_excel(a_share_data, file_name = "hk.xlsx")
+        update_excel(a_share_data, file_name = "a.xlsx", dump_only = True)
+        update_excel(hk_share_data, file_name = "hk.xlsx", dump_only = True)
+
+    now_str = now_str or datetime.now().strftime(TIME_FORMAT)
 
     print("-----------------------------")
-    # update stock prices
-    for i, stock_code in enumerate(stock_codes, start=2):
-        stock_code = str(stock_code)
-        if len(stock_code) == 5:  # hk stock
-            row_data = hk_share_data[hk_share_data["代码"] == stock_code]
-            if not row_data.empty:
-                company_name = row_data.iloc[0]["名称"]
-                latest_price = row_data.iloc[0]["最新价"]
-                # Check if latest_price is valid (not None, NaN, or 0)
-                if pd.isna(latest_price) or latest_price is None or latest_price <= 0:
-                    print(f"--- Warning!!! --- {stock_code} has invalid price: {latest_price}")
-                    continue  # Skip if latest price is invalid
-                percentage_change = row_data.iloc[0]["涨跌幅"] / 100
-                ws.cell(row=i, column=hk_share_price_col, value=latest_price) # write hk stock price
-                ws.cell(row=i, column=percentage_change_col, value=percentage_change) # write hk stock percentage change
-                ws.cell(row=i, column=update_time_col, value=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                
-                # 更新前低（H股使用HKD价格）
-                if previous_low_col:
-                    current_previous_low = ws.cell(row=i, column=previous_low_col).value
-                    if current_previous_low is None or pd.isna(current_previous_low):
-                        new_previous_low = latest_price
-                    else:
-                        new_previous_low = min(latest_price, current_previous_low)
-                    ws.cell(row=i, column=previous_low_col, value=new_previous_low)
-                    print(f"{stock_code:<8} {'H':<2} {company_name:<12} {latest_price:>6.2f} {percentage_change*100:>6.2f}% pre_low:{new_previous_low:>6.2f}")
+    # split the codes by market once, so each loop handles a single market
+    codes = [(i, str(c)) for i, c in enumerate(stock_codes, start=2)]
+    hk_codes = [(i, c) for i, c in codes if len(c) == 5]
+    a_codes = [(i, c) for i, c in codes if len(c) == 6]
+
+    # merge the sheet codes with the spot data and compute the columns in one go
+    hk_df = pd.DataFrame(hk_codes, columns=["行", "代码"]).merge(
+        hk_share_data[["代码", "名称", "最新价", "涨跌幅"]].drop_duplicates("代码"),
+        on="代码", how="left", indicator=True)
+    hk_df["涨跌幅"] = hk_df["涨跌幅"] / 100
+    a_df = pd.DataFrame(a_codes, columns=["行", "代码"]).merge(
+        a_share_data[["代码", "名称", "最新价", "涨跌幅", "总市值"]].drop_duplicates("代码"),
+        on="代码", how="left", indicator=True)
+    a_df["涨跌幅"] = a_df["涨跌幅"] / 100
+    a_df["总股本"] = a_df["总市值"] / a_df["最新价"] * 1e-8
+
+    # update hk stock prices
+    for rec in hk_df.to_dict("records"):
+        i, stock_code = rec["行"], rec["代码"]
+        if rec["_merge"] == "both":
+            company_name = rec["名称"]
+            latest_price = rec["最新价"]
+            # Check if latest_price is valid (not None, NaN, or 0)
+            if pd.isna(latest_price) or latest_price is None or latest_price <= 0:
+                print(f"--- Warning!!! --- {stock_code} has invalid price: {latest_price}")
+                continue  # Skip if latest price is invalid
+            percentage_change = rec["涨跌幅"]
+            updates = {
+                hk_share_price_col: latest_price, # hk stock price
+                percentage_change_col: percentage_change, # hk stock percentage change
+            }
+            
+            # 更新前低（H股使用HKD价格）
+            if previous_low_col:
+                current_previous_low = ws.cell(row=i, column=previous_low_col).value
+                if current_previous_low is None or pd.isna(current_previous_low):
+                    new_previous_low = latest_price
                 else:
-                    print(f"{stock_code:<8} {'H':<2} {company_name:<12} {latest_price:>6.2f} {percentage_change*100:>6.2f}%")
+                    new_previous_low = min(latest_price, current_previous_low)
+                updates[previous_low_col] = new_previous_low
+                print(f"{stock_code:<8} {'H':<2} {company_name:<12} {latest_price:>6.2f} {percentage_change*100:>6.2f}% pre_low:{new_previous_low:>6.2f}")
             else:
-                print(f"--- Warning!!! --- {stock_code} is not found.")
-        elif len(stock_code) == 6:   # A stock
-            row_data = a_share_data[a_share_data["代码"] == stock_code]
-            if not row_data.empty:
-                company_name = row_data.iloc[0]["名称"]
-                latest_price = row_data.iloc[0]["最新价"]
-                # Check if latest_price is valid (not None, NaN, or 0)
-                if pd.isna(latest_price) or latest_price is None or latest_price <= 0:
-                    print(f"--- Warning!!! --- {stock_code} has invalid price: {latest_price}")
-                    continue  # Skip if latest price is invalid
-                percentage_change = row_data.iloc[0]["涨跌幅"] / 100
-                total_val = row_data.iloc[0]["总市值"]
-                total_stock_issue = total_val / latest_price * 1e-8
-                ws.cell(row=i, column=a_share_price_col, value=latest_price)
-                ws.cell(row=i, column=total_stock_issue_col, value=total_stock_issue)
-                ws.cell(row=i, column=percentage_change_col, value=percentage_change) # write hk stock percentage change
-                ws.cell(row=i, column=update_time_col, value=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                
-                # 更新前低（A股使用CNY价格）
-                if previous_low_col:
-                    current_previous_low = ws.cell(row=i, column=previous_low_col).value
-                    if current_previous_low is None or pd.isna(current_previous_low):
-                        new_previous_low = latest_price
-                    else:
-                        new_previous_low = min(latest_price, current_previous_low)
-                    ws.cell(row=i, column=previous_low_col, value=new_previous_low)
-                    print(f"{stock_code:<8} {'A':<2} {company_name:<12} {latest_price:>6.2f} {percentage_change*100:>6.2f}% total_stock_issue:{total_stock_issue:.2f} pre_low:{new_previous_low:>6.2f}")
+                print(f"{stock_code:<8} {'H':<2} {company_name:<12} {latest_price:>6.2f} {percentage_change*100:>6.2f}%")
+            # only stamp the rows whose price actually changed
+            if hk_share_price_col in write_row(ws, i, updates):
+                ws.cell(row=i, column=update_time_col, value=now_str)
+        else:
+            print(f"--- Warning!!! --- {stock_code} is not found.")
+
+    # update A stock prices
+    for rec in a_df.to_dict("records"):
+        i, stock_code = rec["行"], rec["代码"]
+        if rec["_merge"] == "both":
+            company_name = rec["名称"]
+            latest_price = rec["最新价"]
+            # Check if latest_price is valid (not None, NaN, or 0)
+            if pd.isna(latest_price) or latest_price is None or latest_price <= 0:
+                print(f"--- Warning!!! --- {stock_code} has invalid price: {latest_price}")
+                continue  # Skip if latest price is invalid
+            percentage_change = rec["涨跌幅"]
+            total_stock_issue = rec["总股本"]
+            updates = {
+                a_share_price_col: latest_price,
+                total_stock_issue_col: total_stock_issue,
+                percentage_change_col: percentage_change,
+            }
+            
+            # 更新前低（A股使用CNY价格）
+            if previous_low_col:
+                current_previous_low = ws.cell(row=i, column=previous_low_col).value
+                if current_previous_low is None or pd.isna(current_previous_low):
+                    new_previous_low = latest_price
                 else:
-                    print(f"{stock_code:<8} {'A':<2} {company_name:<12} {latest_price:>6.2f} {percentage_change*100:>6.2f}% total_stock_issue:{total_stock_issue:.2f}")
+                    new_previous_low = min(latest_price, current_previous_low)
+                updates[previous_low_col] = new_previous_low
+                print(f"{stock_code:<8} {'A':<2} {company_name:<12} {latest_price:>6.2f} {percentage_change*100:>6.2f}% total_stock_issue:{total_stock_issue:.2f} pre_low:{new_previous_low:>6.2f}")
             else:
-                print(f"--- Warning!!! --- {stock_code} is not found.")
+                print(f"{stock_code:<8} {'A':<2} {company_name:<12} {latest_price:>6.2f} {percentage_change*100:>6.2f}% total_stock_issue:{total_stock_issue:.2f}")
+            # only stamp the rows whose price actually changed
+            if a_share_price_col in write_row(ws, i, updates):
+                ws.cell(row=i, column=update_time_col, value=now_str)
+        else:
+            print(f"--- Warning!!! --- {stock_code} is not found.")
 
-    ws.cell(row=len(stock_codes)+5, column=1, value=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    ws.cell(row=len(stock_codes)+5, column=1, value=now_str)
 
-    wb.save(file_name)
     print("-----------------------------")
-    print(f"the stock prices are updated in {file_name}.")
+    print("the stock prices are updated.")
     return True
 
-def update_stock_volatility(file_name:str, sheet_name:str, update_prices:bool = True):
+def update_stock_volatility(wb, sheet_name:str, update_prices:bool = True, now_str:str = None):
     """
-    update stock volatility and optionally latest closing prices in exist excel
+    update stock volatility and optionally latest closing prices in the loaded workbook, the caller saves it
     @update_prices: bool - whether to update prices from historical data
+    @now_str: str - timestamp written to 更新时间, defaults to now
+    Returns: bool - True if volatility was updated, False otherwise
     """
     print("-----------------------------")
     if update_prices:
@@ -218,21 +458,19 @@ def update_stock_volatility(file_name:str, sheet_name:str, update_prices:bool =
     else:
         print("update stock volatility only...")
 
-    # read excel
-    wb = openpyxl.load_workbook(file_name)
     if sheet_name not in wb.sheetnames:
         print(f"sheet {sheet_name} is not exist!")
-        return
+        return False
     
     ws = wb[sheet_name]
 
-    headers = {cell.value: idx+1 for idx, cell in enumerate(ws[1])}  # 标题 -> 列号映射
+    headers = read_headers(ws)  # 标题 -> 列号映射
 
     required_columns = ["代码", "波动率h", "波动率l", "波动率"]
     for col in required_columns:
         if col not in headers:
             print(f"--- Error!!! --- column {col} is missing.")
-            return
+            return False
 
     stock_code_col = headers["代码"]
     volatility_h_col = headers["波动率h"]
@@ -246,22 +484,32 @@ def update_stock_volatility(file_name:str, sheet_name:str, update_prices:bool =
     update_time_col = headers.get("更新时间")
     previous_low_col = headers.get("前低")
 
-    stock_codes = [row[stock_code_col-1].value for row in ws.iter_rows(min_row=2, max_col=stock_code_col+1) if row[stock_code_col].value]
+    stock_codes = read_codes(ws, stock_code_col)
+
+    # fetching history data concurrently, the requests are network bound
+    print("fetching history data...")
+    with pooled_session(), ThreadPoolExecutor(max_workers=HISTORY_WORKERS) as ex:
+        futures = {ex.submit(get_stock_history, str(c), 30): i for i, c in enumerate(stock_codes, start=2)}
+        histories = {futures[f]: f.result() for f in as_completed(futures)}
+
+    now_str = now_str or datetime.now().strftime(TIME_FORMAT)
 
     print("-----------------------------")
-    # update stock volatility and prices
+    # update stock volatility and prices (openpyxl is not thread-safe, write sequentially)
     for i, stock_code in enumerate(stock_codes, start=2):
         stock_code = str(stock_code)
-        stock_data = get_stock_history(stock_code, days=30)
+        stock_data = histories[i]
         if stock_data.empty:
             print(f"--- Warning!!! --- {stock_code} is not found.")
             continue
             
         # Calculate volatility
         mean_volatility_h, mean_volatility_l, mean_volatility = calculate_volatility(stock_data)
-        ws.cell(row=i, column=volatility_h_col, value=mean_volatility_h)
-        ws.cell(row=i, column=volatility_l_col, value=mean_volatility_l)
-        ws.cell(row=i, column=volatility_col, value=mean_volatility)
+        updates = {
+            volatility_h_col: mean_volatility_h,
+            volatility_l_col: mean_volatility_l,
+            volatility_col: mean_volatility,
+        }
         
         # Update latest closing price from historical data (only if update_prices is True)
         if update_prices:
@@ -269,9 +517,9 @@ def update_stock_volatility(file_name:str, sheet_name:str, update_prices:bool =
             latest_percentage_change = stock_data.iloc[-1]["涨跌幅"] / 100  # Get the latest percentage change
             
             if len(stock_code) == 5 and hk_share_price_col:  # HK stock
-                ws.cell(row=i, column=hk_share_price_col, value=latest_price)
+                updates[hk_share_price_col] = latest_price
                 if percentage_change_col:
-                    ws.cell(row=i, column=percentage_change_col, value=latest_percentage_change)
+                    updates[percentage_change_col] = latest_percentage_change
                 
                 # 更新前低（H股使用HKD价格）
                 if previous_low_col:
@@ -280,14 +528,14 @@ def update_stock_volatility(file_name:str, sheet_name:str, update_prices:bool =
                         new_previous_low = latest_price
                     else:
                         new_previous_low = min(latest_price, current_previous_low)
-                    ws.cell(row=i, column=previous_low_col, value=new_previous_low)
+                    updates[previous_low_col] = new_previous_low
                     print(f"{stock_code:<8} H  volatility_h:{mean_volatility_h:.4f}  volatility_l:{mean_volatility_l:.4f}  volatility:{mean_volatility:.4f}  price:{latest_price:.2f}  change:{latest_percentage_change*100:>6.2f}%  pre_low:{new_previous_low:.2f}")
                 else:
                     print(f"{stock_code:<8} H  volatility_h:{mean_volatility_h:.4f}  volatility_l:{mean_volatility_l:.4f}  volatility:{mean_volatility:.4f}  price:{latest_price:.2f}  change:{latest_percentage_change*100:>6.2f}%")
             elif len(stock_code) == 6 and a_share_price_col:  # A stock
-                ws.cell(row=i, column=a_share_price_col, value=latest_price)
+                updates[a_share_price_col] = latest_price
                 if percentage_change_col:
-                    ws.cell(row=i, column=percentage_change_col, value=latest_percentage_change)
+                    updates[percentage_change_col] = latest_percentage_change
                 
                 # 更新前低（A股使用CNY价格）
                 if previous_low_col:
@@ -296,26 +544,29 @@ def update_stock_volatility(file_name:str, sheet_name:str, update_prices:bool =
                         new_previous_low = latest_price
                     else:
                         new_previous_low = min(latest_price, current_previous_low)
-                    ws.cell(row=i, column=previous_low_col, value=new_previous_low)
+                    updates[previous_low_col] = new_previous_low
                     print(f"{stock_code:<8} A  volatility_h:{mean_volatility_h:.4f}  volatility_l:{mean_volatility_l:.4f}  volatility:{mean_volatility:.4f}  price:{latest_price:.2f}  change:{latest_percentage_change*100:>6.2f}%  pre_low:{new_previous_low:.2f}")
                 else:
                     print(f"{stock_code:<8} A  volatility_h:{mean_volatility_h:.4f}  volatility_l:{mean_volatility_l:.4f}  volatility:{mean_volatility:.4f}  price:{latest_price:.2f}  change:{latest_percentage_change*100:>6.2f}%")
             else:
                 print(f"{stock_code:<8}    volatility_h:{mean_volatility_h:.4f}  volatility_l:{mean_volatility_l:.4f}  volatility:{mean_volatility:.4f}")
-            
-            # Update timestamp if column exists
-            if update_time_col:
-                ws.cell(row=i, column=update_time_col, value=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
         else:
             # Only print volatility information when not updating prices
             print(f"{stock_code:<8}    volatility_h:{mean_volatility_h:.4f}  volatility_l:{mean_volatility_l:.4f}  volatility:{mean_volatility:.4f}")
 
-    wb.save(file_name)
+        changed = write_row(ws, i, updates)
+        # Update timestamp if column exists, only for the rows whose price actually changed
+        if update_prices and update_time_col:
+            price_col = hk_share_price_col if len(stock_code) == 5 else a_share_price_col
+            if price_col in changed:
+                ws.cell(row=i, column=update_time_col, value=now_str)
+
     print("-----------------------------")
     if update_prices:
-        print(f"the stock volatility and prices are updated in {file_name}.")
+        print("the stock volatility and prices are updated.")
     else:
-        print(f"the stock volatility are updated in {file_name}.")
+        print("the stock volatility are updated.")
+    return True
 
 def main():
     parser = argparse.ArgumentParser(description="Update stock data")
@@ -328,16 +579,25 @@ def main():
     file_name = "ValueInvestment_auto.xlsx"
     sheet_name = "预期收益率管理"
 
+    # parse the excel once and save it once, shared by both updaters
+    wb = load_workbook(file_name)
+    # one timestamp for the whole run
+    now_str = datetime.now().strftime(TIME_FORMAT)
     if args.all:
-        price_updated = update_stock_prices(file_name, sheet_name)
+        price_updated = update_stock_prices(wb, sheet_name, now_str)
         # If price update failed, allow volatility function to update prices from historical data
-        update_stock_volatility(file_name, sheet_name, update_prices=not price_updated)
+        volatility_updated = update_stock_volatility(wb, sheet_name, update_prices=not price_updated, now_str=now_str)
+        updated = price_updated or volatility_updated
     elif args.price:
-        update_stock_prices(file_name, sheet_name)
+        updated = update_stock_prices(wb, sheet_name, now_str)
     elif args.volatility:
-        update_stock_volatility(file_name, sheet_name, update_prices=True)  # Always update prices when only running volatility
+        updated = update_stock_volatility(wb, sheet_name, update_prices=True, now_str=now_str)  # Always update prices when only running volatility
     else:
-        update_stock_prices(file_name, sheet_name)
+        updated = update_stock_prices(wb, sheet_name, now_str)
+
+    if updated:
+        wb.save(file_name)
+        print(f"{file_name} is saved.")
 
     os.system(f"open {file_name}")
 